@@ -0,0 +1,102 @@
+"""
+Tick time benchmark for crop_workers.
+
+Runs vision ticks over a synthetic camera frame with a grid of detector areas and an
+instant stub vision backend, so the time measured is what the module itself spends per
+tick: decoding, cropping and encoding areas, and scheduling their tasks.
+
+    python bench/crop_pool.py --areas 100 1000 --workers 0 1 2 4 --ticks 20
+
+Workers 0 is the default in-process path. Run it from any directory with the module's
+virtualenv python; results are printed as JSON, tick times in milliseconds.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image
+from viam.media.utils.pil import pil_to_viam_image
+from viam.media.video import CameraMimeType
+
+from src.models.crop_pool import CropPool
+from src.models.group import Group, evaluate_groups, populate_areas
+from src.models.util import DecodedFrame
+from src.replay import StubVision
+
+LOGGER = logging.getLogger("bench")
+
+def camera_frame(width, height):
+    # noise compresses poorly, like a busy real scene, so decode and encode costs are realistic
+    image = Image.frombytes("RGB", (width, height), random.randbytes(width * height * 3))
+    return pil_to_viam_image(image, CameraMimeType.JPEG)
+
+def grid_groups(areas, groups):
+    """Split a grid of areas covering the frame into groups of detector_bool areas."""
+    side = math.ceil(math.sqrt(areas))
+    boxes = [
+        {"x_min": (i % side) / side, "x_max": (i % side + 1) / side, "y_min": (i // side) / side, "y_max": (i // side + 1) / side}
+        for i in range(areas)
+    ]
+    backend = StubVision()
+    result = []
+    for n in range(groups):
+        g = Group(name=f"g{n}", type="detector_bool", resource="detector", from_label="area", ml_class="person")
+        g.actual_resource = backend
+        populate_areas(g, [("area", b) for b in boxes[n::groups]])
+        result.append(g)
+    return result
+
+async def tick_times(image, groups, workers, ticks):
+    pool = None
+    if workers > 0:
+        pool = CropPool(workers)
+        pool.assign(groups)
+        # the first tick starts the worker processes
+        await pool.crop(DecodedFrame(image))
+
+    times = []
+    try:
+        for _ in range(ticks):
+            start = time.perf_counter()
+            frame = DecodedFrame(image)
+            if pool is not None:
+                await pool.crop(frame)
+            await evaluate_groups(LOGGER, groups, frame)
+            times.append((time.perf_counter() - start) * 1000)
+    finally:
+        if pool is not None:
+            pool.close()
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scene-iq tick time by area count and crop workers")
+    parser.add_argument("--areas", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--groups", type=int, default=16, help="groups the areas are split across")
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--size", type=int, nargs=2, default=[1920, 1080], metavar=("WIDTH", "HEIGHT"))
+    args = parser.parse_args()
+
+    image = camera_frame(*args.size)
+    results = []
+    for areas in args.areas:
+        groups = grid_groups(areas, args.groups)
+        for workers in args.workers:
+            times = asyncio.run(tick_times(image, groups, workers, args.ticks))
+            results.append({"areas": areas, "workers": workers, "median_ms": statistics.median(times), "min_ms": min(times)})
+
+    print(json.dumps({"cpus": os.cpu_count(), "size": args.size, "ticks": args.ticks, "results": results}, indent=2))
+
+if __name__ == '__main__':
+    main()
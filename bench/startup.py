@@ -0,0 +1,86 @@
+"""
+Startup time benchmark for the scene-iq module.
+
+Measures, each in a fresh interpreter:
+
+    import       time to import the model module, plus whether heavy dependencies were pulled in
+    first-ready  time from launching `python -m src.main <socket>` until the module is listening
+
+    python bench/startup.py --runs 10
+
+Run it from any directory with the module's virtualenv python; results are printed as JSON.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that should only be loaded once frames are processed or area dims are fetched
+# (viam.proto.app.data is not listed, viam.utils imports it at startup regardless)
+LAZY_MODULES = ["PIL", "viam.app.viam_client", "src.models.crop_pool"]
+
+IMPORT_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+import src.models.scene_iq
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+"""
+
+def time_import():
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def time_first_ready(timeout):
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, "scene-iq.sock")
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "src.main", socket_path], cwd=ROOT,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            while not os.path.exists(socket_path):
+                if process.poll() is not None:
+                    raise RuntimeError(f"module exited with code {process.returncode} before it was ready")
+                if time.perf_counter() - start > timeout:
+                    raise RuntimeError(f"module was not ready within {timeout}s")
+                time.sleep(0.001)
+            return time.perf_counter() - start
+        finally:
+            process.terminate()
+            process.wait()
+
+def summarize(samples):
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "max": max(samples),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scene-iq module import and first-ready time")
+    parser.add_argument("-n", "--runs", type=int, default=10, help="fresh interpreters to time for each measurement")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for the module to be ready")
+    args = parser.parse_args()
+
+    imports = [time_import() for _ in range(args.runs)]
+    first_ready = [time_first_ready(args.timeout) for _ in range(args.runs)]
+
+    print(json.dumps({
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "import_seconds": summarize([i["seconds"] for i in imports]),
+        "eagerly_loaded": sorted({m for i in imports for m in i["loaded"]}),
+        "first_ready_seconds": summarize(first_ready),
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import asyncio
 from viam.module.module import Module
-from .models.scene_iq import SceneIq
+# importing the models registers both of them with the module registry
+from .models.scene_iq import SceneIq, SceneIqVision
 
 
 if __name__ == '__main__':
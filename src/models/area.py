@@ -1,8 +1,9 @@
 from viam.services.vision import VisionClient
 from .util import *
-from viam.media.utils.pil import viam_to_pil_image
 
 import re
+import time
+import asyncio
 from collections import deque
 
 class AreaDims:
@@ -34,10 +35,72 @@ class RingBuffer:
         """Developer-friendly representation."""
         return f"RingBuffer({self.get()})"
 
+class ReadingsCache:
+    """
+    Time-to-live cache of a sensor's readings, shared by every area reading from that sensor.
+
+    A refresh that takes longer than timeout keeps running in the background while
+    callers get the last known readings, so a slow sensor never stalls a vision tick.
+    A refresh still running after hung_factor times the larger of ttl and timeout is
+    treated as hung, it is cancelled and the sensor polled again.
+    """
+    hung_factor: int = 4
+
+    def __init__(self, sensor, ttl=1.0, timeout=0.5):
+        self.sensor = sensor
+        self.ttl = ttl
+        self.timeout = timeout
+        self.readings = {}
+        self.updated = None
+        self.refresh = None
+        self.refresh_started = None
+
+    @property
+    def hung_after(self):
+        return max(self.ttl, self.timeout) * self.hung_factor
+
+    def current(self):
+        """Whether the cached readings are recent enough to act on, rather than missing or left over from a hung sensor."""
+        return self.updated is not None and time.monotonic() - self.updated <= self.hung_after
+
+    def _store(self, task):
+        if not task.cancelled() and task.exception() is None:
+            self.readings = task.result()
+            self.updated = time.monotonic()
+
+    async def get(self, logger):
+        """Returns the cached readings, refreshing them first if they are older than the TTL."""
+        now = time.monotonic()
+        if self.updated is not None and now - self.updated < self.ttl:
+            return self.readings
+
+        if self.refresh is not None and not self.refresh.done() and now - self.refresh_started > self.hung_after:
+            logger.warning(f"Sensor readings not returned within {self.hung_after}s, polling the sensor again")
+            self.refresh.cancel()
+
+        if self.refresh is None or self.refresh.done():
+            self.refresh = asyncio.create_task(self.sensor.get_readings(timeout=self.hung_after))
+            self.refresh.add_done_callback(self._store)
+            self.refresh_started = now
+
+        try:
+            await asyncio.wait_for(asyncio.shield(self.refresh), self.timeout)
+        except asyncio.TimeoutError:
+            logger.debug(f"Sensor readings not returned within {self.timeout}s, using cached readings")
+        except asyncio.CancelledError:
+            # the refresh was cancelled as hung by another caller, but this caller is still running
+            if asyncio.current_task().cancelling():
+                raise
+        except Exception as e:
+            logger.warning(f"Error getting sensor readings, using cached readings: {e}")
+        return self.readings
+
 class ClassificationMixin:
     def __init__(self, buffer_size=20):
         self.history = RingBuffer(buffer_size)
         self._classification = None
+        # unix time the classification was last set
+        self.updated = None
 
     @property
     def classification(self):
@@ -47,9 +110,12 @@ class ClassificationMixin:
     def classification(self, value):
         self._classification = value
         self.history.append(self._classification)
+        self.updated = time.time()
 
 class AreaGaze(ClassificationMixin):
     type: str = "gaze"
+    # classification when a sensor reports the area empty and inference is skipped
+    empty = False
     index: int
     dims: AreaDims
     to_dims: AreaDims
@@ -65,8 +131,8 @@ class AreaGaze(ClassificationMixin):
     async def get_classification(self, logger, resource: VisionClient, image):
         detections = await resource.get_detections(crop_viam_image(image, vars(self.full_dims)))
         matches = {}
-        pil_image = viam_to_pil_image(image)
-        full_abs_dims = get_absolute_dims(pil_image, vars(self.full_dims))
+        image_size = get_image_size(image)
+        full_abs_dims = get_absolute_dims_from_size(image_size, vars(self.full_dims))
         
         for d in detections:
             match = re.fullmatch(r"(face|gaze)_(.*)", d.class_name)
@@ -82,8 +148,8 @@ class AreaGaze(ClassificationMixin):
         
         for match in matches.values():
             if "face" in match and "gaze" in match:
-                if (check_box_overlap(match["face"], get_absolute_dims(pil_image, vars(self.dims)), 0.25) and
-                        check_box_overlap(match["gaze"], get_absolute_dims(pil_image, vars(self.to_dims)), 0.5)):
+                if (check_box_overlap(match["face"], get_absolute_dims_from_size(image_size, vars(self.dims)), 0.25) and
+                        check_box_overlap(match["gaze"], get_absolute_dims_from_size(image_size, vars(self.to_dims)), 0.5)):
                     self.classification = True
                     return True
         self.classification = False
@@ -91,6 +157,7 @@ class AreaGaze(ClassificationMixin):
 
 class AreaDetectorBool(ClassificationMixin):
     type: str = "detector_bool"
+    empty = False
     index: int
     dims: AreaDims
 
@@ -106,6 +173,7 @@ class AreaDetectorBool(ClassificationMixin):
 
 class AreaDetectorCount(ClassificationMixin):
     type: str = "detector_count"
+    empty = 0
     index: int
     dims: AreaDims
 
@@ -121,6 +189,7 @@ class AreaDetectorCount(ClassificationMixin):
 
 class AreaClassifier(ClassificationMixin):
     type: str = "classifier"
+    empty = ""
     index: int
     dims: AreaDims
 
@@ -136,6 +205,7 @@ class AreaClassifier(ClassificationMixin):
 
 class AreaClassifierBool(ClassificationMixin):
     type: str = "classifier_bool"
+    empty = False
     index: int
     dims: AreaDims
 
@@ -148,3 +218,22 @@ class AreaClassifierBool(ClassificationMixin):
         classifications = await resource.get_classifications(crop_viam_image(image, vars(self.dims)), 5)
         self.classification = any(c.class_name == ml_class and c.confidence >= confidence for c in classifications)
         return self.classification
+
+class AreaSensor(ClassificationMixin):
+    type: str = "sensor"
+    index: int
+    reading_key: str
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self.__dict__.update(kwargs)
+
+    async def get_classification(self, logger, readings_cache: ReadingsCache):
+        value = await readings_cache.get(logger)
+        # nested readings are addressed with dots, e.g. "zones.entrance"
+        for key in self.reading_key.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        # readings not in yet, or without this key, keep the last known value
+        if value is not None:
+            self.classification = value
+        return self.classification
@@ -0,0 +1,117 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from io import BytesIO
+
+from PIL import Image
+from viam.media.video import CameraMimeType, ViamImage
+
+from .util import bbox_key
+
+import asyncio
+
+# shared memory segments attached in this worker process, by name
+_attached = {}
+
+def _attach(name):
+    if name not in _attached:
+        for shm in _attached.values():
+            shm.close()
+        _attached.clear()
+        # spawned workers share the parent's resource tracker, which unlinks the segment if the parent dies
+        _attached[name] = SharedMemory(name=name)
+    return _attached[name]
+
+def crop_areas(shm_name, length, bboxes):
+    """Decode the encoded frame in shared memory, then crop and JPEG encode each normalized bbox, in a worker process."""
+    shm = _attach(shm_name)
+    image = Image.open(BytesIO(bytes(shm.buf[:length])))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    width, height = image.size
+
+    crops = []
+    for bbox in bboxes:
+        cropped_image = image.crop((int(bbox[0] * width), int(bbox[1] * height), int(bbox[2] * width), int(bbox[3] * height)))
+        buf = BytesIO()
+        cropped_image.save(buf, format="JPEG")
+        crops.append(buf.getvalue())
+    return crops
+
+def partition_groups(groups, workers):
+    """Split groups across workers, balancing the number of areas each one crops."""
+    partitions = [[] for _ in range(workers)]
+    loads = [0] * workers
+    for g in sorted(groups, key=lambda g: len(g.areas), reverse=True):
+        i = loads.index(min(loads))
+        partitions[i].append(g)
+        loads[i] += len(g.areas)
+    return [p for p in partitions if p]
+
+def area_bboxes(group):
+    """Normalized (x_min, y_min, x_max, y_max) boxes a group's areas crop from the frame."""
+    bboxes = []
+    for a in group.areas:
+        dims = vars(a.full_dims) if a.type == "gaze" else vars(a.dims)
+        # gaze areas without a matched "to" area have nothing to crop
+        if dims:
+            bboxes.append(bbox_key(dims))
+    return bboxes
+
+class CropPool:
+    """
+    Worker processes that crop and encode areas for a partition of a vision service's groups.
+
+    Each tick the encoded frame is written once to shared memory, every worker decodes it
+    and crops the areas of its groups, and the encoded crops are handed back to the frame
+    so the parent neither decodes the frame nor crops, and areas only have to run inference.
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        # spawn rather than fork, the parent holds gRPC channels that are not fork safe
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        self.shm = None
+        self.partitions = []
+        self.lock = asyncio.Lock()
+
+    def assign(self, groups):
+        """Partition the groups that crop from the camera frame across the workers."""
+        vision_groups = [g for g in groups if g.type != "sensor" and len(g.areas) > 0]
+        self.partitions = [
+            [bbox for g in partition for bbox in area_bboxes(g)]
+            for partition in partition_groups(vision_groups, self.workers)
+        ]
+
+    async def crop(self, frame):
+        """Fill frame.crops with every assigned area's crop, keyed like DecodedFrame.crop."""
+        # raw frames are left to the fallback crop path, workers only decode what PIL can open
+        if frame.viam_image.mime_type not in (CameraMimeType.JPEG, CameraMimeType.PNG):
+            return
+        data = frame.viam_image.data
+        partitions = self.partitions
+
+        async with self.lock:
+            if self.shm is None or self.shm.size < len(data):
+                self.release()
+                self.shm = SharedMemory(create=True, size=len(data))
+            self.shm.buf[:len(data)] = data
+
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(*[
+                loop.run_in_executor(self.executor, crop_areas, self.shm.name, len(data), bboxes)
+                for bboxes in partitions
+            ])
+
+        for bboxes, crops in zip(partitions, results):
+            for bbox, crop in zip(bboxes, crops):
+                frame.crops[bbox] = ViamImage(crop, CameraMimeType.JPEG)
+
+    def release(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.release()
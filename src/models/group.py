@@ -1,7 +1,10 @@
-from .area import AreaClassifier, AreaClassifierBool, AreaDetectorBool, AreaDetectorCount, AreaGaze
+from .area import AreaClassifier, AreaClassifierBool, AreaDetectorBool, AreaDetectorCount, AreaGaze, AreaSensor, AreaDims, ReadingsCache
+from .util import sort_areas_ltr, check_box_overlap, merge_bounding_boxes, eval_area_expression, expression_group_names
 
 from viam.services.vision import VisionClient
 
+import asyncio
+
 class Group():
     name: str
     type: str
@@ -12,9 +15,138 @@ class Group():
     to_label: str = ""
     ml_class: str = ""
     confidence: float = 0.7
-    areas: list[AreaClassifier|AreaClassifierBool|AreaDetectorBool|AreaDetectorCount|AreaGaze]
+    reading_keys: list[str] = []
+    ttl_sec: float = 1.0
+    timeout_sec: float = 0.5
+    readings_cache: ReadingsCache
+    skip_when: str = ""
+    areas: list[AreaClassifier|AreaClassifierBool|AreaDetectorBool|AreaDetectorCount|AreaGaze|AreaSensor]
 
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
             self.__dict__[key] = value
-        self.__dict__['areas'] = []
\ No newline at end of file
+        self.__dict__['areas'] = []
+
+def populate_areas(group, annotations):
+    """
+    Build a group's areas from labeled bounding boxes on its reference image.
+
+    :param group: Group to populate, any existing areas are replaced
+    :param annotations: Iterable of (label, dims) tuples, dims being a dict of normalized 'x_min', 'x_max', 'y_min', 'y_max'
+    """
+    # we want to sort ltr so we store them first
+    areas = []
+    # store any "to" dimensions for gaze detection so we can match them to the "from" afterwards
+    to_dims = []
+
+    for label, dims in annotations:
+        if label == group.from_label:
+            match group.type:
+                case "gaze":
+                    area = AreaGaze()
+                case "detector_bool":
+                    area = AreaDetectorBool()
+                case "detector_count":
+                    area = AreaDetectorCount()
+                case "classifier":
+                    area = AreaClassifier()
+                case "classifier_bool":
+                    area = AreaClassifierBool()
+                case _:
+                    continue
+
+            area.dims = AreaDims(**dims)
+            areas.append(area)
+        elif (group.to_label != "") and (group.type == "gaze") and (label == group.to_label):
+            to_dims.append(dims)
+
+    group.areas = sort_areas_ltr(areas, 0.07)
+
+    # add an ordering index, this should stay static
+    for i, a in enumerate(group.areas):
+        a.index = i
+
+    # match "from" and "to" areas for gaze
+    if group.type == "gaze":
+        for f in group.areas:
+            for t in to_dims:
+                if check_box_overlap(vars(f.dims), t):
+                    f.to_dims = AreaDims(**t)
+                    f.full_dims = AreaDims(**merge_bounding_boxes(f.dims, f.to_dims, 0.03))
+                    break
+
+def area_names(groups):
+    """Stable name for each area across groups, as used for detection class names."""
+    return [f'{g.name}_{g.type}_{a.index}' for g in groups for a in g.areas]
+
+def populate_sensor_areas(group):
+    """Build a sensor group's areas, one per configured reading key, in configured order."""
+    group.areas = [AreaSensor(index=i, reading_key=key) for i, key in enumerate(group.reading_keys)]
+
+def area_classifications(logger, group, image):
+    """Return a classification coroutine for each area of a vision group."""
+    coros = []
+    for a in group.areas:
+        match a.type:
+            case "gaze":
+                coros.append(a.get_classification(logger, group.actual_resource, image))
+            case "detector_bool":
+                coros.append(a.get_classification(logger, group.actual_resource, image, group.ml_class, group.confidence))
+            case "detector_count":
+                coros.append(a.get_classification(logger, group.actual_resource, image, group.ml_class, group.confidence))
+            case "classifier":
+                coros.append(a.get_classification(logger, group.actual_resource, image))
+            case "classifier_bool":
+                coros.append(a.get_classification(logger, group.actual_resource, image, group.ml_class, group.confidence))
+    return coros
+
+def expression_inputs_known(expression, groups):
+    """
+    Whether every area an expression references has a value, with sensor readings that are current.
+
+    Areas without a value are ignored by count() and avg(), so an expression over unknown readings
+    would otherwise read as if the sensor reported nothing.
+    """
+    names = expression_group_names(expression)
+    for g in groups:
+        if g.name not in names:
+            continue
+        if g.type == "sensor" and not g.readings_cache.current():
+            return False
+        if any(a.classification is None for a in g.areas):
+            return False
+    return True
+
+async def evaluate_gated_group(logger, group, groups, image, sensor_tasks):
+    """
+    Run a vision group once sensor readings are in. If its skip_when expression holds, the sensors
+    already cover the group, so inference is skipped and its areas are set to their empty value.
+    Inference always runs while any input to the expression is unknown.
+    """
+    await asyncio.gather(*sensor_tasks)
+    if expression_inputs_known(group.skip_when, groups) and eval_area_expression(group.skip_when, groups):
+        for a in group.areas:
+            a.classification = a.empty
+        return
+    await asyncio.gather(*area_classifications(logger, group, image))
+
+async def evaluate_groups(logger, groups, image):
+    """
+    Run every area of every group against an image concurrently, updating each area's classification.
+
+    Sensor readings are fetched alongside vision inference, except for groups with a skip_when
+    expression, which wait for the sensors and skip inference (setting their areas empty) when it is true.
+    """
+    sensor_tasks = [
+        asyncio.create_task(a.get_classification(logger, g.readings_cache))
+        for g in groups if g.type == "sensor" for a in g.areas
+    ]
+    tasks = list(sensor_tasks)
+    for g in groups:
+        if g.type == "sensor":
+            continue
+        if g.skip_when != "":
+            tasks.append(asyncio.create_task(evaluate_gated_group(logger, g, groups, image, sensor_tasks)))
+        else:
+            tasks.extend(asyncio.create_task(c) for c in area_classifications(logger, g, image))
+    await asyncio.gather(*tasks)
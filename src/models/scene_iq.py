@@ -1,8 +1,8 @@
-from typing import (Any, ClassVar, Dict, Final, List, Mapping, Optional,
+from typing import (TYPE_CHECKING, Any, ClassVar, Dict, Final, List, Mapping, Optional,
                     Sequence, cast)
 
 from typing_extensions import Self
-from viam.components.sensor import *
+from viam.components.sensor import Sensor
 from viam.proto.app.robot import ComponentConfig, ServiceConfig
 from viam.proto.common import Geometry, ResourceName
 from viam.resource.base import ResourceBase
@@ -10,22 +10,26 @@ from viam.resource.easy_resource import EasyResource
 from viam.resource.types import Model, ModelFamily
 from viam.utils import SensorReading, ValueTypes, struct_to_dict
 from viam.services.vision import VisionClient
-from viam.app.viam_client import ViamClient
-from viam.rpc.dial import DialOptions
-from viam.proto.app.data import BinaryID
 from viam.components.camera import Camera
 from viam.components.camera import ViamImage
 from viam.proto.common import PointCloudObject
 from viam.proto.service.vision import Classification, Detection
 from viam.services.vision import Vision, CaptureAllResult
 from viam.proto.service.vision import GetPropertiesResponse
+# viam.utils already loads the app data protos at startup, so there is nothing to gain importing this lazily
+from viam.proto.app.data import BinaryID
 
-from .group import Group
+from .group import Group, area_names, populate_areas, populate_sensor_areas, evaluate_groups
+from .state_file import StateWriter
 from .area import *
 from .util import *
 
+# the app client and crop worker pool are only needed after startup, so they are imported on first use
+if TYPE_CHECKING:
+    from viam.app.viam_client import ViamClient
+    from .crop_pool import CropPool
+
 import os
-import asyncio
 from datetime import datetime
 
 CLASSIFICATION_GLOBAL = {}
@@ -117,7 +121,12 @@ class SceneIqVision(Vision, EasyResource):
     classification: str = ""
     default_classification: str = ""
     last_vision_ts: datetime = None
+    last_image: ViamImage = None
     max_vision_sec: int = 2
+    crop_workers: int = 0
+    crop_pool: "CropPool" = None
+    state_file: str = ""
+    state_writer: StateWriter = None
 
     @classmethod
     def new(
@@ -137,6 +146,8 @@ class SceneIqVision(Vision, EasyResource):
                 deps.append(group["resource"])
             else:
                 raise Exception(f"A resource name for group {group["name"]} must be defined")
+            if group.get("type") == "sensor" and len(group.get("reading_keys", [])) == 0:
+                raise Exception(f"At least one reading key for sensor group {group["name"]} must be defined in 'reading_keys'")
             
         if (len(groups) == 0):
             raise Exception(f"At least one group must be configured in 'groups'")
@@ -155,10 +166,15 @@ class SceneIqVision(Vision, EasyResource):
 
         # reset this to force area dimensions to be reset on first call
         self.area_dims_calculated = False
+        self.last_vision_ts = None
+        self.last_image = None
         self.group_states = []
 
         attributes = struct_to_dict(config.attributes)
         
+        # sensors shared by several groups are polled through a single readings cache
+        readings_caches = {}
+
         # set up each group, instantiating the correct resource client
         g: Group
         for group in attributes.get("groups", []):
@@ -168,7 +184,13 @@ class SceneIqVision(Vision, EasyResource):
                 g.actual_resource = cast(VisionClient, resource_dep)
             else:
                 resource_dep = dependencies[Sensor.get_resource_name(g.resource)]
-                g.actual_resource = cast(Sensor, resource_dep)              
+                g.actual_resource = cast(Sensor, resource_dep)
+                if g.resource not in readings_caches:
+                    readings_caches[g.resource] = ReadingsCache(g.actual_resource, g.ttl_sec, g.timeout_sec)
+                # groups sharing a sensor get the tightest ttl and timeout any of them asks for
+                g.readings_cache = readings_caches[g.resource]
+                g.readings_cache.ttl = min(g.readings_cache.ttl, g.ttl_sec)
+                g.readings_cache.timeout = min(g.readings_cache.timeout, g.timeout_sec)
             self.group_states.append(g)
             
         self.camera_name = attributes.get("camera", "")
@@ -176,6 +198,24 @@ class SceneIqVision(Vision, EasyResource):
         self.camera = cast(Camera, camera_dep)
 
         self.max_vision_sec = attributes.get("max_vision_sec", 2)
+
+        # optionally crop areas in worker processes, partitioned by group, instead of on the event loop
+        if self.crop_pool is not None:
+            self.crop_pool.close()
+            self.crop_pool = None
+        self.crop_workers = int(attributes.get("crop_workers", 0))
+        if self.crop_workers > 0:
+            from .crop_pool import CropPool
+            self.crop_pool = CropPool(self.crop_workers)
+
+        # optionally publish scene state each tick to a memory-mapped file for local consumers,
+        # flagging the previous file stale so existing readers reopen rather than see frozen state
+        if self.state_writer is not None:
+            self.state_writer.close(stale=True)
+            self.state_writer = None
+        self.state_file = attributes.get("state_file", "")
+        if self.state_file != "":
+            self.state_writer = StateWriter(self.state_file)
         self.default_classification = attributes.get("default_classification", "")
         self.classification_expressions = attributes.get("classification_expressions", [])
 
@@ -185,7 +225,10 @@ class SceneIqVision(Vision, EasyResource):
 
         return super().reconfigure(config, dependencies)
     
-    async def viam_connect(self) -> ViamClient:
+    async def viam_connect(self) -> "ViamClient":
+        from viam.app.viam_client import ViamClient
+        from viam.rpc.dial import DialOptions
+
         dial_options = DialOptions.with_api_key( 
             api_key=os.getenv('VIAM_API_KEY'),
             api_key_id=os.getenv('VIAM_API_KEY_ID')
@@ -197,6 +240,10 @@ class SceneIqVision(Vision, EasyResource):
         self.app_client = await self.viam_connect()
 
         for group in self.group_states:
+            if group.type == "sensor":
+                populate_sensor_areas(group)
+                continue
+
             group.areas = []
             image_binary_id = BinaryID(
                 file_id=group.reference_image,
@@ -206,117 +253,64 @@ class SceneIqVision(Vision, EasyResource):
 
             binary_data = await self.app_client.data_client.binary_data_by_ids(binary_ids=[image_binary_id])
 
-            # we want to sort ltr so we store them first
-            areas = []
-            # store any "to" dimensions for gaze detection so we can match them to the "from" afterwards
-            to_dims = []
-
-            for bbox in binary_data[0].metadata.annotations.bboxes:
-                if bbox.label == group.from_label:
-                    match group.type:
-                        case "gaze":
-                            area = AreaGaze()
-                        case "detector_bool":
-                            area = AreaDetectorBool()
-                        case "detector_count":
-                            area = AreaDetectorCount()
-                        case "classifier":
-                            area = AreaClassifier()
-                        case "classifier_bool":
-                            area = AreaClassifierBool()
-                    
-                    area.dims.x_min = bbox.x_min_normalized
-                    area.dims.x_max = bbox.x_max_normalized
-                    area.dims.y_min = bbox.y_min_normalized
-                    area.dims.y_max = bbox.y_max_normalized
-                    areas.append(area)
-                elif (group.to_label != "") and (group.type == "gaze") and (bbox.label == group.to_label):
-                    dims = {
-                        "x_min": bbox.x_min_normalized,
-                        "x_max": bbox.x_max_normalized,
-                        "y_min": bbox.y_min_normalized,
-                        "y_max": bbox.y_max_normalized
-                    }
-                    to_dims.append(dims)
-
-            group.areas = sort_areas_ltr(areas, 0.07)
-
-            # match "from" and "to" areas for gaze
-            if group.type == "gaze":
-                for f in group.areas:
-                    for t in to_dims:
-                        if check_box_overlap(vars(f.dims), t):
-                            f.to_dims = AreaDims(**t)
-                            f.full_dims = AreaDims(**merge_bounding_boxes(f.dims, f.to_dims, 0.03))
-                            break
+            populate_areas(group, (
+                (bbox.label, {
+                    "x_min": bbox.x_min_normalized,
+                    "x_max": bbox.x_max_normalized,
+                    "y_min": bbox.y_min_normalized,
+                    "y_max": bbox.y_max_normalized
+                }) for bbox in binary_data[0].metadata.annotations.bboxes
+            ))
+
+        if self.crop_pool is not None:
+            self.crop_pool.assign(self.group_states)
+        if self.state_writer is not None:
+            self.state_writer.layout(area_names(self.group_states))
 
         self.area_dims_calculated = True
     
     async def do_vision(self, image):
-        tasks = []
-        for g in self.group_states:
-            i = 0
-            for a in g.areas:
-                # add an ordering index, this should stay static
-                a.index = i
-                i = i + 1
-                match a.type:
-                    case "gaze":
-                        tasks.append(asyncio.create_task(a.get_classification(self.logger, g.actual_resource, image)))
-                    case "detector_bool":
-                        tasks.append(asyncio.create_task(a.get_classification(self.logger, g.actual_resource, image, g.ml_class, g.confidence)))
-                    case "detector_count":
-                        tasks.append(asyncio.create_task(a.get_classification(self.logger, g.actual_resource, image, g.ml_class, g.confidence)))
-                    case "classifier":
-                        tasks.append(asyncio.create_task(a.get_classification(self.logger, g.actual_resource, image)))
-                    case "classifier_bool":
-                        tasks.append(asyncio.create_task(a.get_classification(self.logger, g.actual_resource, image, g.ml_class, g.confidence)))
-                    case "sensor":
-                        tasks.append(asyncio.create_task(a.get_classification(self.logger, g.actual_resource)))
-        await asyncio.gather(*tasks)
-    
-        classification = self.default_classification
-        for expression in self.classification_expressions:
-            exp_result = eval_area_expression(expression["expression"], self.group_states)
-            if exp_result:
-                classification = expression["label"]
-                break
-        
-        CLASSIFICATION_GLOBAL[self.name] = classification
-
-    async def get_detections_from_camera(
-        self, camera_name: str, *, extra: Optional[Mapping[str, Any]] = None, timeout: Optional[float] = None
-    ) -> List[Detection]:
-        if camera_name != self.camera_name:
-            return "Error: camera name must match configured camera"
-        else:
-            self.get_detections(await self.camera.get_image())
+        # every area crops from the same frame, decoded at most once and only if the crop pool left crops to do
+        frame = DecodedFrame(image)
+        if self.crop_pool is not None:
+            await self.crop_pool.crop(frame)
+        await evaluate_groups(self.logger, self.group_states, frame)
+        CLASSIFICATION_GLOBAL[self.name] = classify_scene(self.classification_expressions, self.group_states, self.default_classification)
+
+        if self.state_writer is not None:
+            self.state_writer.publish(
+                CLASSIFICATION_GLOBAL[self.name],
+                [(a.classification, a.updated) for g in self.group_states for a in g.areas],
+                datetime.now().timestamp()
+            )
 
-    async def get_detections(
-        self,
-        image: Image.Image,
-        *,
-        extra: Optional[Mapping[str, Any]] = None,
-        timeout: Optional[float] = None,
-    ) -> List[Detection]:
-        
-        detections = []
+    def vision_due(self) -> bool:
+        return self.last_vision_ts is None or (datetime.now() - self.last_vision_ts).total_seconds() > self.max_vision_sec
 
+    async def update(self, image: ViamImage):
+        """Run vision over the image unless it already ran within max_vision_sec."""
         if not self.area_dims_calculated:
             await self.calculate_area_dims()
 
-        current_time = datetime.now()
-        if self.last_vision_ts is None or (current_time - self.last_vision_ts).total_seconds() > self.max_vision_sec:
+        if self.vision_due():
+            current_time = datetime.now()
             await self.do_vision(image)
             self.last_vision_ts = current_time
-        
+            self.last_image = image
+
+    def area_detections(self, image: ViamImage) -> List[Detection]:
+        detections = []
+        image_size = get_image_size(image)
+
         for group in self.group_states:
+            # sensor areas have no location in the image to report
+            if group.type == "sensor":
+                continue
             for area in group.areas:
-                # we could make this more efficient by storing it previously when it was calculated
                 if hasattr(area, 'full_dims'):
-                    abs_dims = get_absolute_dims(viam_to_pil_image(image), vars(area.full_dims))
+                    abs_dims = get_absolute_dims_from_size(image_size, vars(area.full_dims))
                 else:
-                    abs_dims = get_absolute_dims(viam_to_pil_image(image), vars(area.dims))
+                    abs_dims = get_absolute_dims_from_size(image_size, vars(area.dims))
                 detection = { "class_name" : f'{group.name}_{group.type}_{area.index}', "confidence": classification_to_float(area.classification),
                               "x_min": abs_dims["x_min"], "x_max": abs_dims["x_max"], "y_min": abs_dims["y_min"], "y_max": abs_dims["y_max"]
                               }
@@ -324,6 +318,27 @@ class SceneIqVision(Vision, EasyResource):
 
         return detections
 
+    def scene_classifications(self) -> List[Classification]:
+        return [{"class_name": CLASSIFICATION_GLOBAL[self.name], "confidence": 1}]
+
+    async def get_detections_from_camera(
+        self, camera_name: str, *, extra: Optional[Mapping[str, Any]] = None, timeout: Optional[float] = None
+    ) -> List[Detection]:
+        if camera_name != self.camera_name:
+            return "Error: camera name must match configured camera"
+        else:
+            self.get_detections(await self.camera.get_image())
+
+    async def get_detections(
+        self,
+        image: ViamImage,
+        *,
+        extra: Optional[Mapping[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Detection]:
+        await self.update(image)
+        return self.area_detections(image)
+
     async def get_classifications_from_camera(
         self,
         camera_name: str,
@@ -345,16 +360,8 @@ class SceneIqVision(Vision, EasyResource):
         extra: Optional[Mapping[str, Any]] = None,
         timeout: Optional[float] = None,
     ) -> List[Classification]:
-        
-        if not self.area_dims_calculated:
-            await self.calculate_area_dims()
-
-        current_time = datetime.now()
-        if self.last_vision_ts is None or (current_time - self.last_vision_ts).total_seconds() > self.max_vision_sec:
-            await self.do_vision(image)
-            self.last_vision_ts = current_time
-
-        return [{"class_name": CLASSIFICATION_GLOBAL[self.name], "confidence": 1}]
+        await self.update(image)
+        return self.scene_classifications()
     
     async def get_object_point_clouds(
         self, camera_name: str, *, extra: Optional[Mapping[str, Any]] = None, timeout: Optional[float] = None
@@ -375,13 +382,36 @@ class SceneIqVision(Vision, EasyResource):
         extra: Optional[Mapping[str, Any]] = None,
         timeout: Optional[float] = None,
     ) -> CaptureAllResult:
+        if camera_name != self.camera_name:
+            raise Exception("camera name must match configured camera")
+
+        # within the throttle window no new tick would run, so reuse the frame the current results came from
+        if self.last_image is not None and not self.vision_due():
+            image = self.last_image
+        else:
+            image = await self.camera.get_image()
+            # an image on its own needs no evaluation
+            if return_detections or return_classifications:
+                await self.update(image)
+
         result = CaptureAllResult()
-        result.image = await self.camera.get_image()
-        result.detections = await self.get_detections(result.image)
-        result.classifications = await self.get_classifications(result.image, 1)
+        if return_image:
+            result.image = image
+        if return_detections:
+            result.detections = self.area_detections(image)
+        if return_classifications:
+            result.classifications = self.scene_classifications()
 
         return result
 
+    async def close(self):
+        if self.crop_pool is not None:
+            self.crop_pool.close()
+            self.crop_pool = None
+        if self.state_writer is not None:
+            self.state_writer.close(stale=True)
+            self.state_writer = None
+
     async def get_properties(
         self,
         *,
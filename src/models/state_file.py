@@ -0,0 +1,179 @@
+"""
+Memory-mapped scene state, published by the scene-iq vision service each tick.
+
+Local consumers read the scene label and per-area values straight from the file
+instead of calling get_readings. This module only depends on the standard library
+so it can be copied into other projects as the reader.
+
+    reader = StateReader("/dev/shm/scene-iq")
+    state = reader.read()
+
+Layout, little endian:
+
+    header   magic "SIQ1", version u32, flags u32, area count u32, seq u64,
+             tick timestamp f64, scene label 64s
+    areas    per area: value f64, updated timestamp f64, text label 32s
+    names    length u32, area names utf-8, newline separated
+
+Writes are guarded by a seqlock, seq is odd while a tick is being written and
+readers retry until they copy the file between two equal, even seq values. When
+the area layout changes the writer publishes a new file in place and flags the
+old one stale, so readers reopen it. The writer also flags the file stale when the
+vision service is reconfigured or closes, and until a new file replaces it every
+read reports 'stale', so consumers can tell the publisher is gone.
+"""
+
+import math
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b"SIQ1"
+VERSION = 1
+FLAG_STALE = 1
+LABEL_SIZE = 64
+TEXT_SIZE = 32
+
+HEADER = struct.Struct(f"<4sIIIQd{LABEL_SIZE}s")
+AREA = struct.Struct(f"<dd{TEXT_SIZE}s")
+NAMES_LENGTH = struct.Struct("<I")
+FLAGS = struct.Struct("<I")
+SEQ = struct.Struct("<Q")
+FLAGS_OFFSET = 8
+SEQ_OFFSET = 16
+
+# seconds a reader keeps retrying before giving up on a writer stuck mid-tick
+READ_TIMEOUT = 1.0
+
+def _area_value(classification):
+    """Split a classification into the numeric value and text label stored for an area."""
+    if isinstance(classification, (bool, int, float)):
+        return float(classification), b""
+    if classification is None:
+        return math.nan, b""
+    return math.nan, str(classification).encode()[:TEXT_SIZE]
+
+class StateWriter:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.mm = None
+        self.area_count = 0
+        self.seq = 0
+
+    def layout(self, names):
+        """Publish a new, empty state file for the given area names, flagging any previous one stale."""
+        encoded_names = "\n".join(names).encode()
+        body = bytearray(HEADER.size + len(names) * AREA.size)
+        HEADER.pack_into(body, 0, MAGIC, VERSION, 0, len(names), 0, 0.0, b"")
+        for i in range(len(names)):
+            AREA.pack_into(body, HEADER.size + i * AREA.size, math.nan, 0.0, b"")
+        body += NAMES_LENGTH.pack(len(encoded_names)) + encoded_names
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        file = open(tmp_path, "r+b")
+        mm = mmap.mmap(file.fileno(), len(body))
+        os.replace(tmp_path, self.path)
+
+        self.close(stale=True)
+        self.file, self.mm = file, mm
+        self.area_count = len(names)
+        self.seq = 0
+
+    def publish(self, label, classifications, timestamp):
+        """Write one tick of state, classifications being in the same order as the layout names."""
+        if self.mm is None:
+            return
+
+        self.seq += 1
+        SEQ.pack_into(self.mm, SEQ_OFFSET, self.seq)
+        HEADER.pack_into(self.mm, 0, MAGIC, VERSION, 0, self.area_count, self.seq, timestamp, str(label).encode()[:LABEL_SIZE])
+        for i, (classification, updated) in enumerate(classifications):
+            value, text = _area_value(classification)
+            AREA.pack_into(self.mm, HEADER.size + i * AREA.size, value, updated or 0.0, text)
+        self.seq += 1
+        SEQ.pack_into(self.mm, SEQ_OFFSET, self.seq)
+
+    def close(self, stale=False):
+        if self.mm is not None:
+            if stale:
+                FLAGS.pack_into(self.mm, FLAGS_OFFSET, FLAG_STALE)
+            self.mm.close()
+            self.file.close()
+            self.mm = None
+            self.file = None
+
+class StateReader:
+    def __init__(self, path):
+        self.path = path
+        self.mm = None
+        self._open()
+
+    def _open(self):
+        if self.mm is not None:
+            self.mm.close()
+        with open(self.path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.inode = os.fstat(f.fileno()).st_ino
+
+        magic, version, _, area_count, _, _, _ = HEADER.unpack_from(self.mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} scene-iq state file")
+        self.area_count = area_count
+        self.body_size = HEADER.size + area_count * AREA.size
+        names_length, = NAMES_LENGTH.unpack_from(self.mm, self.body_size)
+        names_offset = self.body_size + NAMES_LENGTH.size
+        names = self.mm[names_offset:names_offset + names_length].decode()
+        self.names = names.split("\n") if names else []
+
+    def _replaced(self):
+        """Whether the path now points to a different file than the one mapped."""
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            return False
+
+    def read(self, timeout=READ_TIMEOUT):
+        """
+        Return a consistent snapshot of the scene state.
+
+        :param timeout: Seconds to keep retrying while the writer is mid-tick before raising
+        :return: Dictionary with 'seq', 'timestamp', 'classification', 'stale' (True once the publisher has
+                 stopped writing this file, the state is then frozen) and 'areas', mapping each area
+                 name to its 'value' (text label, or number, NaN if unset) and 'updated' time.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if FLAGS.unpack_from(self.mm, FLAGS_OFFSET)[0] & FLAG_STALE and self._replaced():
+                self._open()
+            seq, = SEQ.unpack_from(self.mm, SEQ_OFFSET)
+            if not seq & 1:
+                data = self.mm[:self.body_size]
+                if SEQ.unpack_from(self.mm, SEQ_OFFSET)[0] == seq:
+                    break
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"No consistent read of {self.path} within {timeout}s, is the writer stuck mid-tick?")
+            # let the writer finish its tick, which matters on single core devices
+            time.sleep(0)
+
+        _, _, flags, _, seq, timestamp, label = HEADER.unpack_from(data)
+        areas = {}
+        for name, (value, updated, text) in zip(self.names, AREA.iter_unpack(data[HEADER.size:])):
+            text = text.rstrip(b"\0")
+            areas[name] = {"value": text.decode(errors="ignore") if text else value, "updated": updated}
+
+        return {
+            "seq": seq,
+            "timestamp": timestamp,
+            "classification": label.rstrip(b"\0").decode(errors="ignore"),
+            "stale": bool(flags & FLAG_STALE),
+            "areas": areas,
+        }
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
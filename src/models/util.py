@@ -1,9 +1,16 @@
-from viam.media.utils.pil import viam_to_pil_image, pil_to_viam_image
-from PIL import Image
 from viam.media.video import CameraMimeType
 from datetime import datetime
 import re
 
+# PIL is only needed once frames are processed, so it is imported on first use to keep module startup fast
+def viam_to_pil_image(viam_image):
+    from viam.media.utils import pil
+    return pil.viam_to_pil_image(viam_image)
+
+def pil_to_viam_image(image, mime_type):
+    from viam.media.utils import pil
+    return pil.pil_to_viam_image(image, mime_type)
+
 def check_box_overlap(box1, box2, threshold=0.0):
     """
     Check if two bounding boxes overlap, if one (expanded) contains the other, 
@@ -78,8 +85,43 @@ def merge_bounding_boxes(box1, box2, padding = 0):
     }
     return merged_box
 
+class DecodedFrame:
+    """
+    A camera frame shared by every area cropping from it during a vision tick.
+
+    The frame is only decoded on the first crop that is not already cached, and at most once.
+    Crops are cached by bounding box, and may be filled in ahead of time (see CropPool).
+    """
+    def __init__(self, viam_image):
+        self.viam_image = viam_image
+        self._image = None
+        self.crops = {}
+        if viam_image.width is not None and viam_image.height is not None:
+            self.width, self.height = viam_image.width, viam_image.height
+        else:
+            self.width, self.height = self.image.size
+
+    @property
+    def image(self):
+        if self._image is None:
+            self._image = viam_to_pil_image(self.viam_image)
+        return self._image
+
+    def crop(self, bbox):
+        key = bbox_key(bbox)
+        if key not in self.crops:
+            self.crops[key] = crop_pil_image(self.image, bbox)
+        return self.crops[key]
+
+def bbox_key(bbox):
+    return (bbox["x_min"], bbox["y_min"], bbox["x_max"], bbox["y_max"])
+
 def crop_viam_image(viam_image, bbox):
-    image = viam_to_pil_image(viam_image)
+    if isinstance(viam_image, DecodedFrame):
+        return viam_image.crop(bbox)
+    return crop_pil_image(viam_to_pil_image(viam_image), bbox)
+
+def crop_pil_image(image, bbox):
     abs_dims = get_absolute_dims(image, bbox)
 
     # Crop the image (left, upper, right, lower)
@@ -93,7 +135,10 @@ def crop_viam_image(viam_image, bbox):
     return pil_to_viam_image(cropped_image, CameraMimeType.JPEG)
 
 def get_absolute_dims(image, bbox):
-    width, height = image.size  # Get original image size
+    return get_absolute_dims_from_size(image.size, bbox)
+
+def get_absolute_dims_from_size(size, bbox):
+    width, height = size
 
     # Convert relative coordinates to absolute pixel values
     x_min = int(bbox["x_min"] * width)
@@ -108,6 +153,12 @@ def get_absolute_dims(image, bbox):
         "y_max": y_max,
     }
 
+def get_image_size(viam_image):
+    """Return (width, height) of a ViamImage, reading it from the JPEG/PNG header where possible instead of decoding."""
+    if viam_image.width is not None and viam_image.height is not None:
+        return viam_image.width, viam_image.height
+    return viam_to_pil_image(viam_image).size
+
 
 def sort_areas_ltr(areas, y_tolerance=0.02):
     """
@@ -162,25 +213,41 @@ def get_group(groups, name):
     """Find a group by name."""
     return next((g for g in groups if g.name == name), None)
 
+def numeric_classification(value):
+    """Numeric value of a classification for expressions, or None if it is unset or not a number."""
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+def numeric_values(values):
+    """Numeric values of classifications, skipping any that are unset or not a number."""
+    return [n for n in (numeric_classification(v) for v in values) if n is not None]
+
 def avg(group):
     """Calculate the average classification value of a group's areas."""
     if not group or not group.areas:
         return 0
-    values = [(a.classification if isinstance(a.classification, (int, float)) else int(a.classification)) for a in group.areas]
+    values = numeric_values(a.classification for a in group.areas)
     return sum(values) / len(values) if values else 0
 
 def count(group):
     """Count the sum of classification values in a group's areas."""
     if not group or not group.areas:
         return 0
-    return sum(a.classification if isinstance(a.classification, (int, float)) else int(a.classification) for a in group.areas)
+    return sum(numeric_values(a.classification for a in group.areas))
 
 def avg_max(group, x):
     """Find the average of the highest classification values from the last X stored values across areas."""
     if not group or not group.areas:
         return 0
     max_values = [
-        max([(v if isinstance(v, (int, float)) else int(v)) for v in area.history.get()[:x]], default=0)
+        max(numeric_values(area.history.get()[:x]), default=0)
         for area in group.areas
     ]
     return sum(max_values) / len(max_values) if max_values else 0
@@ -190,17 +257,22 @@ def count_max(group, x):
     if not group or not group.areas:
         return 0
     return sum(
-        max([(v if isinstance(v, (int, float)) else int(v)) for v in area.history.get()[:x]], default=0)
+        max(numeric_values(area.history.get()[:x]), default=0)
         for area in group.areas
     )
 
+# Match avg(), count(), avg_max(), and count_max()
+EXPRESSION_PATTERN = re.compile(r"(avg|count|avg_max|count_max)\((\w+)(?:,\s*(\d+))?\)")
+
+def expression_group_names(expression):
+    """Names of the groups an expression references."""
+    return {group_name for _, group_name, _ in EXPRESSION_PATTERN.findall(expression)}
+
 def eval_area_expression(expression, groups):
     """Evaluate a logical expression based on group data."""
     expression = expression.replace("&&", " and ").replace("||", " or ")
 
-    # Match avg(), count(), avg_max(), and count_max()
-    pattern = re.compile(r"(avg|count|avg_max|count_max)\((\w+)(?:,\s*(\d+))?\)")
-    matches = pattern.findall(expression)
+    matches = EXPRESSION_PATTERN.findall(expression)
 
     for func, group_name, x in matches:
         group = get_group(groups, group_name)
@@ -217,4 +289,11 @@ def eval_area_expression(expression, groups):
         
         expression = expression.replace(f"{func}({group_name}{', ' + x if x else ''})", str(value))
 
-    return eval(expression)
\ No newline at end of file
+    return eval(expression)
+
+def classify_scene(expressions, groups, default=""):
+    """Return the label of the first classification expression that evaluates true, or the default label."""
+    for expression in expressions:
+        if eval_area_expression(expression["expression"], groups):
+            return expression["label"]
+    return default
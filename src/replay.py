@@ -0,0 +1,248 @@
+"""
+Offline replay of scene-iq group, area and expression logic over recorded frames.
+
+Runs the same evaluation as the scene-iq vision service against a directory of
+images or a video file, unthrottled and sharded across processes, writing the
+per-frame area values and scene label to a CSV, Parquet or NPZ file.
+
+    python -m src.replay config.json /path/to/frames -o results.csv --workers 8
+
+The config file holds the vision service attributes ("groups",
+"classification_expressions", "default_classification"). Each group may carry
+its own "annotations" list of {"label", "x_min", "x_max", "y_min", "y_max"}
+normalized boxes; groups without them have their reference_image annotations
+fetched once from Viam using the same environment variables as the service.
+Vision resources are resolved through "backends", mapping a group resource name
+to {"class": "module:Class", "attributes": {...}}. Any resource not listed falls
+back to StubVision, or StubSensor for sensor groups, so a replay can run fully
+offline.
+"""
+
+import argparse
+import asyncio
+import csv
+import importlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+from viam.media.utils.pil import pil_to_viam_image
+from viam.media.video import CameraMimeType, ViamImage
+from viam.proto.service.vision import Classification, Detection
+
+from .models.area import ReadingsCache
+from .models.group import Group, area_names, populate_areas, populate_sensor_areas, evaluate_groups
+from .models.util import DecodedFrame, classify_scene
+
+IMAGE_MIME_TYPES = {
+    ".jpg": CameraMimeType.JPEG,
+    ".jpeg": CameraMimeType.JPEG,
+    ".png": CameraMimeType.PNG,
+}
+
+LOGGER = logging.getLogger("scene-iq-replay")
+
+class StubVision:
+    """
+    Offline stand-in for a vision service, returning the same configured
+    detections and classifications for every image.
+    """
+    def __init__(self, detections=None, classifications=None):
+        self.detections = [Detection(**d) for d in detections or []]
+        self.classifications = [Classification(**c) for c in classifications or []]
+
+    async def get_detections(self, image, **kwargs):
+        return self.detections
+
+    async def get_classifications(self, image, count, **kwargs):
+        return self.classifications[:count]
+
+class StubSensor:
+    """Offline stand-in for a sensor, returning the same configured readings on every call."""
+    def __init__(self, readings=None):
+        self.readings = readings or {}
+
+    async def get_readings(self, **kwargs):
+        return self.readings
+
+def load_backend(spec, default="StubVision"):
+    """Instantiate a backend from a {"class": "module:Class", "attributes": {...}} spec."""
+    module_name, class_name = spec.get("class", f"{__name__}:{default}").split(":")
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    return backend_class(**spec.get("attributes", {}))
+
+async def fetch_annotations(groups):
+    """Fetch reference image annotations from Viam for any group that does not define its own."""
+    from viam.app.viam_client import ViamClient
+    from viam.proto.app.data import BinaryID
+    from viam.rpc.dial import DialOptions
+
+    dial_options = DialOptions.with_api_key(
+        api_key=os.getenv('VIAM_API_KEY'),
+        api_key_id=os.getenv('VIAM_API_KEY_ID')
+    )
+    app_client = await ViamClient.create_from_dial_options(dial_options)
+
+    try:
+        for group in groups:
+            if "annotations" in group or group["type"] == "sensor":
+                continue
+            image_binary_id = BinaryID(
+                file_id=group["reference_image"],
+                organization_id=os.getenv('VIAM_PRIMARY_ORG_ID'),
+                location_id=os.getenv('VIAM_LOCATION_ID')
+            )
+            binary_data = await app_client.data_client.binary_data_by_ids(binary_ids=[image_binary_id])
+            group["annotations"] = [
+                {
+                    "label": bbox.label,
+                    "x_min": bbox.x_min_normalized,
+                    "x_max": bbox.x_max_normalized,
+                    "y_min": bbox.y_min_normalized,
+                    "y_max": bbox.y_max_normalized
+                } for bbox in binary_data[0].metadata.annotations.bboxes
+            ]
+    finally:
+        app_client.close()
+
+def build_groups(config):
+    """Build group states from a replay config, resolving each group resource to a backend."""
+    backends = {}
+    groups = []
+    for group in config["groups"]:
+        g = Group(**{k: v for k, v in group.items() if k != "annotations"})
+        if g.resource not in backends:
+            default = "StubSensor" if g.type == "sensor" else "StubVision"
+            backends[g.resource] = load_backend(config.get("backends", {}).get(g.resource, {}), default)
+        g.actual_resource = backends[g.resource]
+        if g.type == "sensor":
+            # recorded frames carry no wall clock, so sensors are read on every frame
+            g.readings_cache = ReadingsCache(g.actual_resource, 0, g.timeout_sec)
+            populate_sensor_areas(g)
+        else:
+            populate_areas(g, (
+                (a["label"], {k: a[k] for k in ("x_min", "x_max", "y_min", "y_max")}) for a in group["annotations"]
+            ))
+        groups.append(g)
+    return groups
+
+def list_frames(source):
+    """Return the number of frames in a directory of images or a video file."""
+    if os.path.isdir(source):
+        return len(list_images(source))
+
+    import cv2
+    capture = cv2.VideoCapture(source)
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    return frame_count
+
+def list_images(directory):
+    return sorted(
+        os.path.join(directory, f) for f in os.listdir(directory)
+        if os.path.splitext(f)[1].lower() in IMAGE_MIME_TYPES
+    )
+
+def read_frames(source, start, stop):
+    """Yield (frame number, frame name, ViamImage) for frames start..stop of the source."""
+    if os.path.isdir(source):
+        for i, path in enumerate(list_images(source)[start:stop], start):
+            with open(path, "rb") as f:
+                data = f.read()
+            yield i, os.path.basename(path), ViamImage(data, IMAGE_MIME_TYPES[os.path.splitext(path)[1].lower()])
+        return
+
+    import cv2
+    capture = cv2.VideoCapture(source)
+    try:
+        # seeking with CAP_PROP_POS_FRAMES can land on a keyframe instead of the requested frame,
+        # so step up to start without decoding to keep frame numbers identical to a sequential run
+        for _ in range(start):
+            if not capture.grab():
+                return
+        for i in range(start, stop):
+            ok, frame = capture.read()
+            if not ok:
+                break
+            image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            yield i, str(i), pil_to_viam_image(image, CameraMimeType.JPEG)
+    finally:
+        capture.release()
+
+async def replay_frames(config, source, start, stop, warmup):
+    groups = build_groups(config)
+    expressions = config.get("classification_expressions", [])
+    default_classification = config.get("default_classification", "")
+
+    rows = []
+    for i, name, image in read_frames(source, start - warmup, stop):
+        await evaluate_groups(LOGGER, groups, DecodedFrame(image))
+        label = classify_scene(expressions, groups, default_classification)
+        # frames before start only prime area history so *_max() expressions match a sequential run
+        if i >= start:
+            rows.append([i, name, label] + [a.classification for g in groups for a in g.areas])
+    return rows
+
+def replay_shard(config, source, start, stop, warmup):
+    return asyncio.run(replay_frames(config, source, start, stop, warmup))
+
+def write_columns(path, columns):
+    """Write a dict of equal length columns to a .csv, .parquet or .npz file."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        import pyarrow
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(pyarrow.table(columns), path)
+    elif extension == ".npz":
+        import numpy
+        numpy.savez_compressed(path, **{name: numpy.asarray(values) for name, values in columns.items()})
+    else:
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns.keys())
+            writer.writerows(zip(*columns.values()))
+
+def replay(config, source, output, workers=None):
+    """Replay every frame of source through the configured groups, sharded across worker processes."""
+    if any("annotations" not in g and g["type"] != "sensor" for g in config["groups"]):
+        asyncio.run(fetch_annotations(config["groups"]))
+
+    groups = build_groups(config)
+    names = ["frame", "source", "classification"] + area_names(groups)
+    # area history depth, replayed ahead of each shard
+    warmup = max((a.history.buffer.maxlen for g in groups for a in g.areas), default=0)
+
+    frame_count = list_frames(source)
+    workers = max(1, min(workers or os.cpu_count(), frame_count))
+    bounds = [frame_count * i // workers for i in range(workers + 1)]
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(replay_shard, config, source, start, stop, min(warmup, start))
+            for start, stop in zip(bounds, bounds[1:])
+        ]
+        for future in futures:
+            rows.extend(future.result())
+
+    write_columns(output, {name: [row[i] for row in rows] for i, name in enumerate(names)})
+    return len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded frames through scene-iq groups and expressions")
+    parser.add_argument("config", help="JSON file with the scene-iq vision service attributes")
+    parser.add_argument("source", help="directory of images or a video file")
+    parser.add_argument("-o", "--output", default="replay.csv", help="output file, .csv, .parquet or .npz")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes, defaults to the CPU count")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+
+    count = replay(config, args.source, args.output, args.workers)
+    print(f"Replayed {count} frames to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+
+import pytest
+
+pytest.importorskip("viam")
+
+from PIL import Image
+from viam.media.utils.pil import pil_to_viam_image
+from viam.media.video import CameraMimeType
+
+from src.models.area import ReadingsCache
+from src.models.group import Group, evaluate_groups, populate_areas, populate_sensor_areas
+from src.models.util import DecodedFrame
+from src.replay import StubVision
+
+LOGGER = logging.getLogger("test")
+
+
+class CountingSensor:
+    def __init__(self, readings, delay=0.0):
+        self.readings = readings
+        self.delay = delay
+        self.calls = 0
+        self.timeouts = []
+
+    async def get_readings(self, timeout=None, **kwargs):
+        self.calls += 1
+        self.timeouts.append(timeout)
+        await asyncio.sleep(self.delay)
+        return self.readings
+
+
+def test_readings_within_ttl_are_cached():
+    async def run():
+        sensor = CountingSensor({"zone": True})
+        cache = ReadingsCache(sensor, ttl=60, timeout=1)
+        assert await cache.get(LOGGER) == {"zone": True}
+        assert await cache.get(LOGGER) == {"zone": True}
+        return sensor
+
+    assert asyncio.run(run()).calls == 1
+
+
+def test_slow_readings_fall_back_to_cache():
+    async def run():
+        sensor = CountingSensor({"zone": True})
+        cache = ReadingsCache(sensor, ttl=0, timeout=0.05)
+        await cache.get(LOGGER)
+        sensor.readings, sensor.delay = {"zone": False}, 10
+        return await asyncio.wait_for(cache.get(LOGGER), 1)
+
+    assert asyncio.run(run()) == {"zone": True}
+
+
+def test_hung_refresh_is_polled_again():
+    async def run():
+        sensor = CountingSensor({"zone": True}, delay=3600)
+        cache = ReadingsCache(sensor, ttl=0, timeout=0.01)
+        for _ in range(5):
+            await cache.get(LOGGER)
+            await asyncio.sleep(cache.hung_after)
+        cache.refresh.cancel()
+        return sensor, cache
+
+    sensor, cache = asyncio.run(run())
+    assert sensor.calls > 1
+    assert sensor.timeouts[0] == cache.hung_after
+
+
+def gated_groups(sensor):
+    pir = Group(name="pir", type="sensor", resource="pir", reading_keys=["zone"], ttl_sec=0, timeout_sec=0.01)
+    pir.actual_resource = sensor
+    pir.readings_cache = ReadingsCache(sensor, pir.ttl_sec, pir.timeout_sec)
+    populate_sensor_areas(pir)
+
+    seats = Group(name="seats", type="detector_bool", resource="detector", from_label="seat",
+                  ml_class="person", skip_when="count(pir) == 0")
+    seats.actual_resource = StubVision(detections=[{"class_name": "person", "confidence": 0.9}])
+    populate_areas(seats, [("seat", {"x_min": 0.0, "x_max": 0.5, "y_min": 0.0, "y_max": 0.5})])
+    return [pir, seats]
+
+
+def frame():
+    return DecodedFrame(pil_to_viam_image(Image.new("RGB", (64, 64)), CameraMimeType.JPEG))
+
+
+def test_skip_when_runs_inference_while_readings_are_unknown():
+    async def run():
+        sensor = CountingSensor({"zone": False}, delay=3600)
+        groups = gated_groups(sensor)
+        await evaluate_groups(LOGGER, groups, frame())
+        groups[0].readings_cache.refresh.cancel()
+        return groups
+
+    pir, seats = asyncio.run(run())
+    assert pir.areas[0].classification is None
+    assert seats.areas[0].classification is True
+
+
+def test_skip_when_skips_inference_once_readings_are_known():
+    async def run():
+        groups = gated_groups(CountingSensor({"zone": False}))
+        await evaluate_groups(LOGGER, groups, frame())
+        return groups
+
+    pir, seats = asyncio.run(run())
+    assert pir.areas[0].classification is False
+    assert seats.areas[0].classification is False
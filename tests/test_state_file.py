@@ -0,0 +1,118 @@
+import math
+import threading
+import time
+
+import pytest
+
+from src.models.state_file import SEQ, SEQ_OFFSET, StateReader, StateWriter
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "scene-iq")
+
+
+def test_publish_round_trip(path):
+    writer = StateWriter(path)
+    writer.layout(["seats_detector_bool_0", "seats_classifier_0", "pir_sensor_0"])
+    reader = StateReader(path)
+
+    writer.publish("occupied", [(True, 1.0), ("person", 2.0), (None, None)], 3.0)
+    state = reader.read()
+
+    assert state["seq"] == 2
+    assert state["timestamp"] == 3.0
+    assert state["classification"] == "occupied"
+    assert state["areas"]["seats_detector_bool_0"] == {"value": 1.0, "updated": 1.0}
+    assert state["areas"]["seats_classifier_0"] == {"value": "person", "updated": 2.0}
+    assert math.isnan(state["areas"]["pir_sensor_0"]["value"])
+
+
+def test_layout_change_reopens_reader(path):
+    writer = StateWriter(path)
+    writer.layout(["a_detector_bool_0"])
+    reader = StateReader(path)
+    writer.publish("one", [(True, 1.0)], 1.0)
+    assert reader.read()["classification"] == "one"
+
+    writer.layout(["b_detector_count_0", "b_detector_count_1"])
+    writer.publish("two", [(1, 2.0), (2, 2.0)], 2.0)
+    state = reader.read()
+
+    assert state["classification"] == "two"
+    assert list(state["areas"]) == ["b_detector_count_0", "b_detector_count_1"]
+
+
+def test_new_writer_after_stale_close_reopens_reader(path):
+    writer = StateWriter(path)
+    writer.layout(["a_detector_bool_0"])
+    reader = StateReader(path)
+    writer.publish("one", [(True, 1.0)], 1.0)
+    assert reader.read()["classification"] == "one"
+
+    # what the vision service does on reconfigure
+    writer.close(stale=True)
+    writer = StateWriter(path)
+    writer.layout(["a_detector_bool_0"])
+    writer.publish("two", [(False, 2.0)], 2.0)
+    state = reader.read()
+
+    assert state["classification"] == "two"
+    assert state["stale"] is False
+
+
+def test_read_waits_out_writer_mid_tick(path):
+    writer = StateWriter(path)
+    writer.layout(["a_detector_count_0"])
+    reader = StateReader(path)
+
+    SEQ.pack_into(writer.mm, SEQ_OFFSET, 1)
+    with pytest.raises(RuntimeError):
+        reader.read(timeout=0.01)
+
+
+def test_reads_are_consistent_while_publishing(path):
+    names = [f"a_detector_count_{i}" for i in range(500)]
+    writer = StateWriter(path)
+    writer.layout(names)
+    reader = StateReader(path)
+    done = threading.Event()
+
+    def publish():
+        n = 0
+        while not done.is_set():
+            n += 1
+            writer.publish(str(n), [(n, float(n))] * len(names), float(n))
+            # ticks are paced by max_vision_sec in the service, keep them frequent but not back to back
+            time.sleep(0.0005)
+
+    thread = threading.Thread(target=publish)
+    thread.start()
+    try:
+        for _ in range(200):
+            state = reader.read()
+            if state["seq"] == 0:
+                continue
+            tick = float(state["classification"])
+            assert all(area["value"] == tick for area in state["areas"].values())
+    finally:
+        done.set()
+        thread.join()
+
+
+def test_stale_close_without_new_file_is_reported(path, monkeypatch):
+    writer = StateWriter(path)
+    writer.layout(["a_detector_bool_0"])
+    reader = StateReader(path)
+    writer.publish("one", [(True, 1.0)], 1.0)
+    assert reader.read()["stale"] is False
+
+    writer.close(stale=True)
+    opens = []
+    monkeypatch.setattr(reader, "_open", lambda: opens.append(True))
+    state = reader.read()
+
+    assert state["stale"] is True
+    assert state["classification"] == "one"
+    # the path still points to the same file, so there is nothing new to reopen
+    assert opens == []